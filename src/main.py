@@ -1,13 +1,24 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Dict, Union
 from src.utils import Base, engine, setup_logger, get_db
+from src.timeutils import as_naive_utc
 from src.models.dedup_model import DedupEvent
 from src.models.stats_model import Stats
+from src.models.rollup_model import TopicRollup
+from src.services.rollups import BUCKETS
+from src.services.cache import response_cache
+from src.services.partitioning import partition_router, verify_layout
 from src.services.processor import EventProcessor
+from src.services.validation import validation_backend
+from src.services.idempotency import idempotency_store, fingerprint, IdempotencyConflict
+from src.services import profiling
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import distinct, text
+from sqlalchemy import distinct, text, func
 from sqlalchemy.orm import Session
 from contextlib import asynccontextmanager
+import json
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -17,6 +28,10 @@ logger = setup_logger()
 # Lifespan context to initialize stats
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Startup: Refuse to serve if the dedup partitions changed without a rebalance
+    with Session(engine) as db:
+        verify_layout(db, partition_router.urls)
+
     # Startup: Ensure stats row exists
     with Session(engine) as db:
         stats = db.query(Stats).first()
@@ -30,11 +45,39 @@ async def lifespan(app: FastAPI):
                 # Might happen if another worker initializes it concurrently
                 db.rollback()
     yield
+    # Shutdown: Stop validation workers, if any were started
+    validation_backend.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
+if profiling.PROFILING_ENABLED:
+    profiling.install(app)
+
 START_TIME = datetime.now(timezone.utc)
 
+def cached_json(request: Request, topic: str | None, build):
+    """
+    Serve a JSON response from the read cache, building it with `build()` on a miss.
+    Topic-scoped reads are versioned per topic, everything else on the global version.
+    """
+    if not response_cache.enabled:
+        return build()
+
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    version = response_cache.version(topic)
+    cached = response_cache.get(key, version)
+    if cached is not None:
+        body, etag = cached
+    else:
+        body = json.dumps(build()).encode("utf-8")
+        etag = response_cache.put(key, version, body)
+
+    headers = {"ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/")
 def main():
     return {
@@ -47,32 +90,94 @@ async def publish_event(
     request: Request,
     db: Session = Depends(get_db)
 ):
+    async def process():
+        try:
+            data = await request.json()
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+        if isinstance(data, dict):
+            events_data = [data]
+        elif isinstance(data, list):
+            events_data = data
+        else:
+            raise HTTPException(status_code=400, detail="Request body must be a JSON object or array")
+
+        processor = EventProcessor(db)
+        if validation_backend.offloads(len(events_data)):
+            # Keep the event loop serving other requests while the pool validates
+            return await run_in_threadpool(processor.process_batch, events_data)
+        return processor.process_batch(events_data)
+
+    key = request.headers.get("idempotency-key")
+    if not key:
+        return await process()
+
+    # Retries with the same key get the first result back, without decoding or deduping again
+    body_fingerprint = fingerprint(await request.body())
     try:
-        data = await request.json()
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid JSON body")
-
-    if isinstance(data, dict):
-        events_data = [data]
-    elif isinstance(data, list):
-        events_data = data
-    else:
-        raise HTTPException(status_code=400, detail="Request body must be a JSON object or array")
+        result, replayed = await idempotency_store.run(key, body_fingerprint, process)
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
 
-    processor = EventProcessor(db)
-    result = processor.process_batch(events_data)
-    
-    return result
+    return JSONResponse(content=result, headers={"Idempotent-Replayed": str(replayed).lower()})
 
 
 @app.get("/events")
-def get_events(topic: str = None, limit: int = 100, db: Session = Depends(get_db)):
-    query = db.query(DedupEvent)
-    if topic:
-        query = query.filter_by(topic=topic)
-    
-    # Order by timestamp desc
-    events = query.order_by(DedupEvent.timestamp.desc()).limit(limit).all()
+def get_events(
+    request: Request,
+    topic: str = None,
+    source: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    count_only: bool = False,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    return cached_json(
+        request, topic,
+        lambda: _query_events(db, topic, limit, source, since, until, count_only)
+    )
+
+
+def _query_events(db: Session, topic: str | None, limit: int,
+                  source: str | None = None, since: datetime | None = None,
+                  until: datetime | None = None, count_only: bool = False):
+    def filtered(query):
+        # Equality filters first, then the timestamp range: matches the composite indexes
+        if topic:
+            query = query.filter(DedupEvent.topic == topic)
+        if source:
+            query = query.filter(DedupEvent.source == source)
+        if since:
+            query = query.filter(DedupEvent.timestamp >= as_naive_utc(since))
+        if until:
+            query = query.filter(DedupEvent.timestamp < as_naive_utc(until))
+        return query
+
+    if count_only:
+        def count_partition(session: Session):
+            return filtered(session.query(func.count()).select_from(DedupEvent)).scalar()
+
+        if partition_router.enabled:
+            count = sum(partition_router.fan_out(count_partition))
+        else:
+            count = count_partition(db)
+        return {"count": count}
+
+    def query_partition(session: Session):
+        query = filtered(session.query(DedupEvent))
+        
+        # Order by timestamp desc
+        return query.order_by(DedupEvent.timestamp.desc()).limit(limit).all()
+
+    if partition_router.enabled:
+        # Each partition returns its own newest `limit`, the global newest are among them
+        merged = [e for part in partition_router.fan_out(query_partition) for e in part]
+        merged.sort(key=lambda e: e.timestamp or datetime.min, reverse=True)
+        events = merged[:limit]
+    else:
+        events = query_partition(db)
 
     if not events and topic:
         # User requirement says: "Endpoint GET /events?topic=...: daftar event unik yang telah diproses."
@@ -93,13 +198,23 @@ def get_events(topic: str = None, limit: int = 100, db: Session = Depends(get_db
 
 
 @app.get("/stats")
-def get_stats(db: Session = Depends(get_db)):
+def get_stats(request: Request, db: Session = Depends(get_db)):
+    return cached_json(request, None, lambda: _query_stats(db))
+
+
+def _query_stats(db: Session):
     # Retrieve persistent stats
     stats = db.query(Stats).filter(Stats.id == 1).first()
     
     # Calculate live topics count
     # Note: large scale this is slow, but for requirements it works.
-    topics = [row[0] for row in db.query(distinct(DedupEvent.topic)).all()]
+    def query_topics(session: Session):
+        return [row[0] for row in session.query(distinct(DedupEvent.topic)).all()]
+
+    if partition_router.enabled:
+        topics = sorted({t for part in partition_router.fan_out(query_topics) for t in part})
+    else:
+        topics = query_topics(db)
     
     uptime = datetime.now(timezone.utc) - START_TIME
     
@@ -112,4 +227,79 @@ def get_stats(db: Session = Depends(get_db)):
         "duplicate_dropped": stats.duplicate_dropped,
         "topics": topics,
         "uptime": str(timedelta(seconds=int(uptime.total_seconds())))
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/stats/cache")
+def get_cache_stats():
+    return response_cache.metrics()
+
+
+@app.get("/stats/timeseries")
+def get_timeseries(
+    request: Request,
+    topic: str = None,
+    source: str = None,
+    bucket: str = "minute",
+    since: datetime = None,
+    until: datetime = None,
+    limit: int = 1000,
+    db: Session = Depends(get_db)
+):
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {list(BUCKETS)}")
+    return cached_json(
+        request, topic,
+        lambda: _query_timeseries(db, topic, source, bucket, since, until, limit)
+    )
+
+
+def _query_timeseries(db: Session, topic, source, bucket, since, until, limit):
+
+    group_cols = [TopicRollup.topic, TopicRollup.bucket_start]
+    if source is not None:
+        group_cols.append(TopicRollup.source)
+
+    query = db.query(
+        *group_cols,
+        func.sum(TopicRollup.unique_count),
+        func.sum(TopicRollup.duplicate_count),
+        func.sum(TopicRollup.value_count),
+        func.sum(TopicRollup.value_sum),
+        func.min(TopicRollup.value_min),
+        func.max(TopicRollup.value_max),
+    ).filter(TopicRollup.bucket == bucket)
+
+    if topic:
+        query = query.filter(TopicRollup.topic == topic)
+    if source is not None:
+        query = query.filter(TopicRollup.source == source)
+    if since:
+        query = query.filter(TopicRollup.bucket_start >= as_naive_utc(since))
+    if until:
+        query = query.filter(TopicRollup.bucket_start < as_naive_utc(until))
+
+    # Newest buckets first for the limit, returned oldest first for charting
+    rows = (
+        query.group_by(*group_cols)
+        .order_by(TopicRollup.bucket_start.desc())
+        .limit(limit)
+        .all()
+    )
+
+    result = []
+    for row in reversed(rows):
+        unique, dupes, value_count, value_sum, value_min, value_max = row[len(group_cols):]
+        result.append({
+            "topic": row[0],
+            "source": source,
+            "bucket": bucket,
+            "bucket_start": row[1].isoformat(),
+            "unique": unique or 0,
+            "duplicates": dupes or 0,
+            "value_count": value_count or 0,
+            "value_min": value_min,
+            "value_max": value_max,
+            "value_avg": (value_sum / value_count) if value_count else None,
+        })
+    return result
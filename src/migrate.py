@@ -0,0 +1,186 @@
+"""
+One-off schema migration for existing databases.
+
+    python -m src.migrate
+
+create_all() only creates indexes together with new tables, so a dedup
+table created before the (topic, timestamp) / (source, timestamp) /
+(timestamp) indexes existed never gets them. Run this once after upgrading,
+before or alongside the service, never from the request-serving workers.
+On Postgres the indexes are built with CREATE INDEX CONCURRENTLY so
+ingestion keeps writing to dedup while they build.
+
+    python -m src.migrate --repartition
+
+Moves dedup rows to the partitions in --partition-urls (default
+DEDUP_PARTITION_URLS; empty means back into the main database) and records
+that layout, which the service checks at startup. Stop the service first.
+If the previous partitions had passwords, pass them with
+--previous-partition-urls, since the recorded layout masks them. An
+interrupted run leaves the layout marked "rebalancing"; just run it again.
+"""
+import argparse
+import os
+from sqlalchemy import delete, inspect, select, tuple_
+from sqlalchemy.orm import Session
+from src.utils import Base, DATABASE_URL, create_db_engine, setup_logger
+from src.models.dedup_model import DedupEvent
+from src.services.bulk_import import COLUMNS, load_rows
+from src.services.partitioning import layout_urls, partition_of, read_layout, record_layout
+
+logger = setup_logger("Migrate")
+
+
+def _drop_invalid_indexes(engine, table_name: str) -> set[str]:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        invalid = {row[0] for row in conn.exec_driver_sql(
+            "SELECT c.relname FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_class t ON t.oid = i.indrelid "
+            "WHERE t.relname = %(table)s AND NOT i.indisvalid",
+            {"table": table_name},
+        )}
+        for name in invalid:
+            logger.info(f"Dropping invalid index {name}")
+            conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    return invalid
+
+
+def create_dedup_indexes(engine):
+    """Create any DedupEvent index missing on `engine`, without blocking writes on Postgres."""
+    table = DedupEvent.__table__
+    if not inspect(engine).has_table(table.name):
+        # New tables get their indexes from create_all()
+        return
+    existing = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+    if engine.dialect.name == "postgresql":
+        # An interrupted CREATE INDEX CONCURRENTLY leaves an INVALID index behind; rebuild it
+        existing -= _drop_invalid_indexes(engine, table.name)
+
+    for index in table.indexes:
+        if index.name in existing:
+            continue
+        logger.info(f"Creating index {index.name} on {engine.url.render_as_string(hide_password=True)}")
+        if engine.dialect.name == "postgresql":
+            columns = ", ".join(column.name for column in index.columns)
+            # CONCURRENTLY cannot run inside a transaction block
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name} ON {table.name} ({columns})"
+                )
+        else:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _split_urls(value: str) -> list[str]:
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+
+def _move_rows(source, targets: list, source_index: int | None, chunk_size: int) -> int:
+    """
+    Copy every row of `source` whose key hashes to another target into that
+    target, then delete it from `source`. Keyset-paginated so memory stays
+    at one chunk; safe to repeat because the insert skips existing keys.
+    """
+    table = DedupEvent.__table__
+    columns = [table.c[name] for name in COLUMNS]
+    moved = 0
+    after = None
+    while True:
+        query = select(*columns).order_by(table.c.topic, table.c.event_id).limit(chunk_size)
+        if after is not None:
+            query = query.where(tuple_(table.c.topic, table.c.event_id) > after)
+        with source.connect() as conn:
+            rows = [dict(row._mapping) for row in conn.execute(query)]
+        if not rows:
+            return moved
+        after = (rows[-1]["topic"], rows[-1]["event_id"])
+
+        by_target: dict[int, list[dict]] = {}
+        for row in rows:
+            index = partition_of(row["topic"], row["event_id"], len(targets)) if len(targets) > 1 else 0
+            if index != source_index:
+                by_target.setdefault(index, []).append(row)
+
+        for index, target_rows in by_target.items():
+            load_rows(targets[index], target_rows)
+            keys = [(row["topic"], row["event_id"]) for row in target_rows]
+            with source.begin() as conn:
+                conn.execute(delete(table).where(tuple_(table.c.topic, table.c.event_id).in_(keys)))
+            moved += len(target_rows)
+        logger.info(f"{source.url.render_as_string(hide_password=True)}: {moved} rows moved")
+
+
+def repartition(database_url: str, partition_urls: list[str], previous_urls: list[str] | None = None,
+                chunk_size: int = 10000) -> int:
+    """Move dedup rows from the recorded layout to `partition_urls` and record the new layout."""
+    main_engine = create_db_engine(database_url)
+    Base.metadata.create_all(bind=main_engine)
+    engines = {}
+    try:
+        with Session(main_engine) as db:
+            layout = read_layout(db)
+            recorded = list(layout.urls or []) if layout is not None else []
+            if previous_urls is None:
+                previous_urls = recorded
+            elif layout is not None and layout_urls(previous_urls) != recorded:
+                raise SystemExit(f"--previous-partition-urls does not match the recorded layout {recorded}")
+            # Mark first: the service refuses to start until the move has finished
+            record_layout(db, partition_urls, state="rebalancing")
+            db.commit()
+
+        def engine_for(url):
+            if url not in engines:
+                engines[url] = main_engine if url == database_url else create_db_engine(url)
+                DedupEvent.__table__.create(bind=engines[url], checkfirst=True)
+            return engines[url]
+
+        # Rows may sit in the old locations or, after an interrupted run, already in the new ones
+        target_urls = partition_urls or [database_url]
+        targets = [engine_for(url) for url in target_urls]
+        moved = 0
+        for url in dict.fromkeys((previous_urls or [database_url]) + target_urls):
+            source_index = target_urls.index(url) if url in target_urls else None
+            moved += _move_rows(engine_for(url), targets, source_index, chunk_size)
+
+        with Session(main_engine) as db:
+            record_layout(db, partition_urls)
+            db.commit()
+        logger.info(f"Repartitioned dedup rows across {len(target_urls)} database(s), {moved} rows moved.")
+        return moved
+    finally:
+        for engine in engines.values():
+            if engine is not main_engine:
+                engine.dispose()
+        main_engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.migrate",
+                                     description="Add missing dedup indexes, optionally move dedup rows to new partitions.")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Main database (default: DATABASE_URL)")
+    parser.add_argument("--partition-urls", default=os.getenv("DEDUP_PARTITION_URLS", ""),
+                        help="Comma-separated partition databases (default: DEDUP_PARTITION_URLS)")
+    parser.add_argument("--repartition", action="store_true",
+                        help="Move dedup rows to --partition-urls and record that layout (service must be stopped)")
+    parser.add_argument("--previous-partition-urls", default=None,
+                        help="Current partitions, if the recorded layout can't be used to connect (masked passwords)")
+    args = parser.parse_args(argv)
+
+    partition_urls = _split_urls(args.partition_urls)
+    urls = [args.database_url] + partition_urls
+    for url in urls:
+        engine = create_db_engine(url)
+        try:
+            create_dedup_indexes(engine)
+        finally:
+            engine.dispose()
+
+    if args.repartition:
+        previous = _split_urls(args.previous_partition_urls) if args.previous_partition_urls is not None else None
+        repartition(args.database_url, partition_urls, previous)
+    logger.info("Migration finished.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
-from sqlalchemy import Column, String, DateTime, JSON
+from sqlalchemy import Column, String, DateTime, JSON, Index
 from datetime import datetime
 from src.utils import Base
 
 class DedupEvent(Base):
     __tablename__ = "dedup"
+    __table_args__ = (
+        # Range scans for /events?topic=...&since=... and ?source=...&since=...
+        # Both stay index-only for ?count_only=true
+        Index("ix_dedup_topic_timestamp", "topic", "timestamp"),
+        Index("ix_dedup_source_timestamp", "source", "timestamp"),
+        Index("ix_dedup_timestamp", "timestamp"),
+    )
 
     topic = Column(String, primary_key=True)
     event_id = Column(String, primary_key=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
     source = Column(String)
-    payload = Column(JSON)
\ No newline at end of file
+    payload = Column(JSON)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Integer, DateTime, JSON
+from datetime import datetime
+from src.utils import Base
+
+class PartitionLayout(Base):
+    __tablename__ = "partition_layout"
+
+    # Single row describing where dedup rows live; absent means the main dedup table
+    id = Column(Integer, primary_key=True)
+    partition_count = Column(Integer, default=0)
+    urls = Column(JSON)  # partition URLs with passwords masked, in routing order
+    state = Column(String, default="ready")  # "ready" or "rebalancing"
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, Integer, Float, DateTime
+from src.utils import Base
+
+class TopicRollup(Base):
+    __tablename__ = "topic_rollup"
+
+    # Primary key order matches the dashboard query: one topic, one bucket size, a time range
+    topic = Column(String, primary_key=True)
+    bucket = Column(String, primary_key=True)  # "minute" or "hour"
+    bucket_start = Column(DateTime, primary_key=True)
+    source = Column(String, primary_key=True, default="")
+    unique_count = Column(Integer, default=0)
+    duplicate_count = Column(Integer, default=0)
+    # Aggregates over the numeric payload field (unique events only)
+    value_count = Column(Integer, default=0)
+    value_sum = Column(Float, default=0.0)
+    value_min = Column(Float, nullable=True)
+    value_max = Column(Float, nullable=True)
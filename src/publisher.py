@@ -32,33 +32,44 @@ def generate_event(topic=None, source=None):
 
 def run_loop():
     logger.info(f"Starting publisher service. Target: {AGGREGATOR_URL}")
+    # Batch that has not been acknowledged yet; it is re-sent with the same Idempotency-Key
+    pending = None
     while True:
         try:
-            # Generate unique events
-            events = [generate_event() for _ in range(BATCH_SIZE)]
-            
-            # Select some to be duplicates (re-use existing IDs from THIS batch or potential historical - here simplistically internal dupes)
-            # To test REAL persistent dedup, we should probably re-send some OLD events.
-            # But "publisher sends duplicates" usually means redundant transmission.
-            
-            # Let's create a "duplication" by picking a few events from the generated list and adding them again.
-            num_dupes = int(BATCH_SIZE * DUPLICATION_RATE)
-            if num_dupes > 0:
-                duplicates = random.sample(events, num_dupes)
-                events.extend(duplicates)
-                random.shuffle(events)
-            
-            response = requests.post(AGGREGATOR_URL, json=events)
+            if pending is None:
+                # Generate unique events
+                events = [generate_event() for _ in range(BATCH_SIZE)]
+                
+                # Select some to be duplicates (re-use existing IDs from THIS batch or potential historical - here simplistically internal dupes)
+                # To test REAL persistent dedup, we should probably re-send some OLD events.
+                # But "publisher sends duplicates" usually means redundant transmission.
+                
+                # Let's create a "duplication" by picking a few events from the generated list and adding them again.
+                num_dupes = int(BATCH_SIZE * DUPLICATION_RATE)
+                if num_dupes > 0:
+                    duplicates = random.sample(events, num_dupes)
+                    events.extend(duplicates)
+                    random.shuffle(events)
+
+                pending = (str(uuid.uuid4()), events, num_dupes)
+
+            key, events, num_dupes = pending
+            response = requests.post(AGGREGATOR_URL, json=events, headers={"Idempotency-Key": key})
             response.raise_for_status()
+            pending = None
             logger.info(f"Sent {len(events)} events (approx {num_dupes} dupes). Response: {response.status_code}")
             
             time.sleep(DELAY)
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Connection error: {e}. Retrying in 5s...")
+            if e.response is not None and e.response.status_code < 500:
+                # Rejected by the aggregator, re-sending the same batch won't help
+                pending = None
             time.sleep(5)
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
+            pending = None
             time.sleep(1)
 
 if __name__ == "__main__":
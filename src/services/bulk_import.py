@@ -0,0 +1,256 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import Session
+from src.utils import Base, DATABASE_URL, create_db_engine, setup_logger
+from src.models.dedup_model import DedupEvent
+from src.models.stats_model import Stats
+from src.services.processor import EventProcessor
+from src.services.validation import build_row
+from src.services.rollups import RollupAccumulator
+from src.services.partitioning import partition_router, verify_layout
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import time
+import os
+
+logger = setup_logger("BulkImport")
+
+# Rows per transaction (one COPY / one executemany per chunk and target database)
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "50000"))
+
+COLUMNS = ("topic", "event_id", "timestamp", "source", "payload")
+
+
+def read_events(path):
+    """
+    Stream raw events from a JSONL/NDJSON file (optionally .gz). A line may hold
+    one event or an array of events, like a /publish body. Lines that are not
+    valid JSON are yielded as None so they are counted like invalid events.
+    """
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                yield None
+                continue
+            if isinstance(data, list):
+                yield from data
+            else:
+                yield data
+
+
+def _load_sqlite(conn, rows: list[dict]) -> set[tuple]:
+    # executemany of INSERT ... ON CONFLICT DO NOTHING; RETURNING tells which rows were new
+    stmt = (
+        sqlite.insert(DedupEvent)
+        .on_conflict_do_nothing()
+        .returning(DedupEvent.topic, DedupEvent.event_id)
+    )
+    return {tuple(r) for r in conn.execute(stmt, rows)}
+
+
+def _load_postgres(conn, rows: list[dict]) -> set[tuple]:
+    # COPY into a session-local staging table, then one set-based INSERT ... ON CONFLICT
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([
+            row["topic"],
+            row["event_id"],
+            row["timestamp"].isoformat(sep=" ") if row["timestamp"] else r"\N",
+            row["source"] if row["source"] is not None else r"\N",
+            json.dumps(row["payload"]) if row["payload"] is not None else r"\N",
+        ])
+    buf.seek(0)
+
+    columns = ", ".join(COLUMNS)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS dedup_import "
+            "(LIKE dedup INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        cursor.copy_expert(
+            f"COPY dedup_import ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf
+        )
+        cursor.execute(
+            f"INSERT INTO dedup ({columns}) SELECT {columns} FROM dedup_import "
+            "ON CONFLICT (topic, event_id) DO NOTHING RETURNING topic, event_id"
+        )
+        return {tuple(r) for r in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def load_rows(engine, rows: list[dict]) -> set[tuple]:
+    """Insert rows in one transaction, skipping existing keys. Returns the (topic, event_id) keys that were new."""
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            return _load_postgres(conn, rows)
+        return _load_sqlite(conn, rows)
+
+
+def import_file(path, database_url: str = DATABASE_URL, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Import one file. Runs inside a worker process, so it opens its own engines.
+    Stats and rollups are applied right after each chunk is loaded, so a file
+    that fails halfway leaves counters that match the rows it did store.
+    Returns plain counters for the parent's summary.
+    """
+    engine = create_db_engine(database_url)
+    targets = partition_router.engines if partition_router.enabled else [engine]
+    rollups = RollupAccumulator()
+    # Keys of the current chunk only; ON CONFLICT dedupes across chunks and against the table
+    seen: set[tuple] = set()
+    summary = {"file": str(path), "received": 0, "invalid": 0, "unique": 0, "duplicates": 0}
+    # Counters not yet written to Stats
+    pending = {"received": 0, "invalid": 0, "unique": 0, "duplicates": 0}
+    chunk: list[dict] = []
+
+    def count(field: str):
+        summary[field] += 1
+        pending[field] += 1
+
+    def apply_pending():
+        if any(pending.values()):
+            _apply_totals(engine, pending, rollups)
+            for field in pending:
+                pending[field] = 0
+
+    def flush_chunk():
+        by_target: dict[int, list[dict]] = {}
+        for row in chunk:
+            index = partition_router.partition_for(row["topic"], row["event_id"]) if partition_router.enabled else 0
+            by_target.setdefault(index, []).append(row)
+
+        try:
+            for index, rows in by_target.items():
+                inserted = load_rows(targets[index], rows)
+                for row in rows:
+                    if (row["topic"], row["event_id"]) in inserted:
+                        count("unique")
+                        rollups.add(row["topic"], row["source"], row["timestamp"], row["payload"])
+                    else:
+                        # Already stored by an earlier import, another worker, or the live service
+                        count("duplicates")
+                        rollups.add(row["topic"], row["source"], row["timestamp"], duplicate=True)
+        finally:
+            # Also after a failed partition: account for the targets that did commit
+            apply_pending()
+        chunk.clear()
+        seen.clear()
+        logger.info(f"{path}: {summary['received']} read, {summary['unique']} new, {summary['duplicates']} duplicates")
+
+    try:
+        for raw_event in read_events(path):
+            count("received")
+            if raw_event is None:
+                count("invalid")
+                continue
+            try:
+                row = build_row(raw_event)
+            except Exception:
+                count("invalid")
+                continue
+
+            key = (row["topic"], row["event_id"])
+            if key in seen:
+                # Duplicate within the chunk: a single INSERT can't report it
+                count("duplicates")
+                rollups.add(row["topic"], row["source"], row["timestamp"], duplicate=True)
+                continue
+            seen.add(key)
+
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                flush_chunk()
+        if chunk:
+            flush_chunk()
+        # Invalid lines after the last chunk
+        apply_pending()
+    finally:
+        engine.dispose()
+
+    return summary
+
+
+def _ensure_stats(db: Session):
+    if db.query(Stats).filter(Stats.id == 1).first() is None:
+        db.add(Stats(id=1, received=0, unique_processed=0, duplicate_dropped=0))
+        db.flush()
+
+
+def _apply_totals(engine, totals: dict, rollups: RollupAccumulator):
+    """Add one chunk's counters and rollup deltas to Stats and rollups, in one transaction."""
+    with Session(engine) as db:
+        _ensure_stats(db)
+        EventProcessor(db)._update_stats(totals["received"], totals["unique"], totals["duplicates"])
+        rollups.flush(db)
+        db.commit()
+
+
+def run_import(paths: list, database_url: str = DATABASE_URL, workers: int | None = None,
+               chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Import files in parallel, one worker process per file. SQLite allows a single
+    writer, so unless partitions are configured it defaults to one worker there.
+    """
+    paths = [str(p) for p in paths]
+    # Fail before loading anything rather than after the earlier files are in
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if missing:
+        raise FileNotFoundError(f"Input files not found: {', '.join(missing)}")
+
+    if workers is None:
+        if database_url.startswith("sqlite") and not partition_router.enabled:
+            workers = 1
+        else:
+            workers = min(len(paths), os.cpu_count() or 1)
+
+    engine = create_db_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    try:
+        with Session(engine) as db:
+            # Same check as the service: rows routed with a stale layout would miss their duplicates
+            verify_layout(db, partition_router.urls)
+            # Created here so parallel workers don't race to insert it
+            _ensure_stats(db)
+            db.commit()
+    finally:
+        engine.dispose()
+
+    totals = {"files": 0, "received": 0, "invalid": 0, "unique": 0, "duplicates": 0}
+    started = time.perf_counter()
+
+    def collect(summary: dict):
+        totals["files"] += 1
+        for field in ("received", "invalid", "unique", "duplicates"):
+            totals[field] += summary[field]
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"[{totals['files']}/{len(paths)}] {summary['file']} done: "
+            f"{summary['unique']} new, {summary['duplicates']} duplicates, {summary['invalid']} invalid "
+            f"({totals['received'] / elapsed:.0f} events/s overall)"
+        )
+
+    if workers <= 1:
+        for path in paths:
+            collect(import_file(path, database_url, chunk_size))
+    else:
+        # spawn, not fork: forked children would share the parent's pooled partition connections
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(import_file, path, database_url, chunk_size) for path in paths]
+            for future in as_completed(futures):
+                collect(future.result())
+
+    totals["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Import finished: {totals}")
+    return totals
@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+import os
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+# Upper bound on how old a cached response may be, even if no version bump was seen.
+# Version counters are per process, so this is what bounds staleness across uvicorn workers.
+CACHE_MAX_STALENESS = float(os.getenv("CACHE_MAX_STALENESS", "1.0"))
+
+
+class ResponseCache:
+    """
+    Read cache for rendered JSON responses, keyed on path + query parameters.
+
+    Every entry remembers the version it was built against: the per-topic
+    counter for topic-scoped reads, or the global counter otherwise.
+    EventProcessor bumps the counters after each commit, which makes older
+    entries miss without having to track which keys they belong to.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_staleness: float = CACHE_MAX_STALENESS,
+                 enabled: bool = CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.max_staleness = max_staleness
+        self.enabled = enabled
+        self.entries: OrderedDict = OrderedDict()
+        self.topic_versions: dict[str, int] = {}
+        self.global_version = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, topic: str | None = None) -> int:
+        if topic is None:
+            return self.global_version
+        return self.topic_versions.get(topic, 0)
+
+    def bump(self, topics=()):
+        """Invalidate reads of the given topics and every unscoped read (stats, all events)."""
+        with self.lock:
+            self.global_version += 1
+            for topic in topics:
+                self.topic_versions[topic] = self.topic_versions.get(topic, 0) + 1
+
+    def get(self, key, version: int):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                body, etag, entry_version, created = entry
+                if entry_version == version and time.monotonic() - created <= self.max_staleness:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return body, etag
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, version: int, body: bytes) -> str:
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        with self.lock:
+            self.entries[key] = (body, etag, version, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return etag
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "max_staleness": self.max_staleness,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache()
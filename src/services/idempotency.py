@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import asyncio
+import hashlib
+import time
+import os
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "3600"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used with a different request body."""
+
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Remembers the result of each Idempotency-Key for a bounded time so retried
+    /publish calls are answered without touching the dedup table. A retry that
+    arrives while the first request is still running waits for its result
+    instead of processing the batch a second time.
+
+    Keys are held per process; with several uvicorn workers a retry routed to
+    another worker falls back to normal per-event dedup, which is still correct.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.results: OrderedDict = OrderedDict()
+        self.in_flight: dict[str, tuple[str, asyncio.Future]] = {}
+
+    def _lookup(self, key: str):
+        entry = self.results.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[2] > self.ttl:
+            del self.results[key]
+            return None
+        return entry
+
+    def _remember(self, key: str, body_fingerprint: str, result):
+        self.results[key] = (body_fingerprint, result, time.monotonic())
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_keys:
+            self.results.popitem(last=False)
+
+    async def run(self, key: str, body_fingerprint: str, compute):
+        """
+        Return `(result, replayed)`. `compute` is an async callable that is
+        awaited only if neither a stored nor an in-flight result exists for `key`.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            if entry[0] != body_fingerprint:
+                raise IdempotencyConflict(key)
+            return entry[1], True
+
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            if pending[0] != body_fingerprint:
+                raise IdempotencyConflict(key)
+            # shield: a disconnecting retry must not cancel the original request
+            return await asyncio.shield(pending[1]), True
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = (body_fingerprint, future)
+        try:
+            result = await compute()
+        except BaseException as e:
+            # Failures are not stored, waiters see the error and the client may retry
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # mark retrieved when nobody was waiting
+            raise
+        else:
+            self._remember(key, body_fingerprint, result)
+            future.set_result(result)
+            return result, False
+        finally:
+            del self.in_flight[key]
+
+    def clear(self):
+        self.results.clear()
+
+
+idempotency_store = IdempotencyStore()
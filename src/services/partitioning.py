@@ -0,0 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from src.utils import create_db_engine
+from src.models.dedup_model import DedupEvent
+from src.models.partition_layout_model import PartitionLayout
+import contextvars
+import logging
+import zlib
+import os
+
+logger = logging.getLogger("PartitionRouter")
+
+# Comma-separated database URLs, one per partition (separate SQLite files or
+# Postgres databases/nodes). Empty means dedup state stays in the main database.
+DEDUP_PARTITION_URLS = os.getenv("DEDUP_PARTITION_URLS", "")
+
+
+def partition_of(topic: str, event_id: str, count: int) -> int:
+    # crc32 is stable across processes and machines, unlike hash()
+    return zlib.crc32(f"{topic}\x00{event_id}".encode("utf-8")) % count
+
+
+class PartitionLayoutMismatch(RuntimeError):
+    """The configured partitions don't match where the dedup rows actually live."""
+
+
+def layout_urls(urls: list[str]) -> list[str]:
+    """Partition URLs as recorded in the main database (passwords masked)."""
+    return [make_url(url).render_as_string(hide_password=True) for url in urls]
+
+
+def read_layout(db: Session) -> PartitionLayout | None:
+    return db.query(PartitionLayout).filter(PartitionLayout.id == 1).first()
+
+
+def record_layout(db: Session, urls: list[str], state: str = "ready"):
+    """Store the partition layout. Commit happens in the caller."""
+    layout = read_layout(db)
+    if layout is None:
+        layout = PartitionLayout(id=1)
+        db.add(layout)
+    layout.partition_count = len(urls)
+    layout.urls = layout_urls(urls)
+    layout.state = state
+
+
+def verify_layout(db: Session, urls: list[str]):
+    """
+    Refuse to run when the configured partitions differ from the recorded
+    layout: with crc32 % N routing, changing the partition list sends most
+    existing keys to a partition that has never seen them, so old events
+    would be accepted as new. Rows have to be moved first with
+    `python -m src.migrate --repartition`.
+    """
+    layout = read_layout(db)
+    if layout is None:
+        if urls and db.query(DedupEvent).first() is not None:
+            raise PartitionLayoutMismatch(
+                "DEDUP_PARTITION_URLS is set but the main dedup table still holds events; "
+                "run `python -m src.migrate --repartition` first"
+            )
+        if urls:
+            # First start of a fresh partitioned deployment
+            record_layout(db, urls)
+            db.commit()
+        return
+
+    if layout.state != "ready":
+        raise PartitionLayoutMismatch(
+            f"Dedup partitions are being rebalanced (state {layout.state!r}); "
+            "finish `python -m src.migrate --repartition` first"
+        )
+    if list(layout.urls or []) != layout_urls(urls):
+        raise PartitionLayoutMismatch(
+            f"Configured dedup partitions {layout_urls(urls)} differ from the recorded layout "
+            f"{layout.urls}; run `python -m src.migrate --repartition` to move the rows"
+        )
+
+
+class PartitionRouter:
+    """
+    Routes each (topic, event_id) to one of N dedup databases and runs
+    per-partition work on a shared thread pool, one task per partition.
+    """
+
+    def __init__(self, urls: list[str] | None = None):
+        self.urls = []
+        self.engines = []
+        self.sessionmakers = []
+        self.pool = None
+        self.configure(urls or [])
+
+    def configure(self, urls: list[str]):
+        for engine in self.engines:
+            engine.dispose()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+        self.urls = list(urls)
+        self.engines = [create_db_engine(url) for url in urls]
+        self.sessionmakers = [sessionmaker(bind=engine) for engine in self.engines]
+        for engine in self.engines:
+            DedupEvent.__table__.create(bind=engine, checkfirst=True)
+        self.pool = ThreadPoolExecutor(
+            max_workers=len(self.engines), thread_name_prefix="dedup-partition"
+        ) if self.engines else None
+
+        if self.engines:
+            logger.info(f"Dedup storage partitioned across {len(self.engines)} databases.")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    @property
+    def count(self) -> int:
+        return len(self.engines)
+
+    def partition_for(self, topic: str, event_id: str) -> int:
+        return partition_of(topic, event_id, self.count)
+
+    def session(self, index: int):
+        return self.sessionmakers[index]()
+
+    def run(self, work, items_by_partition: dict[int, object]) -> dict[int, object]:
+        """Call `work(index, items)` for every partition in parallel and return the results by partition."""
+        # Executor threads don't inherit contextvars; copy them so per-request state (e.g. SQL tracing) follows
+        futures = {
+            index: self.pool.submit(contextvars.copy_context().run, work, index, items)
+            for index, items in items_by_partition.items()
+        }
+        return {index: future.result() for index, future in futures.items()}
+
+    def fan_out(self, query) -> list:
+        """Run a read `query(session)` against every partition and return the results in partition order."""
+        def task(index, _):
+            with self.session(index) as session:
+                return query(session)
+
+        results = self.run(task, {i: None for i in range(self.count)})
+        return [results[i] for i in range(self.count)]
+
+partition_router = PartitionRouter(
+    [url.strip() for url in DEDUP_PARTITION_URLS.split(",") if url.strip()]
+)
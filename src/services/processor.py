@@ -1,77 +1,186 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import tuple_
 from sqlalchemy.exc import IntegrityError
 from src.models.dedup_model import DedupEvent
 from src.models.stats_model import Stats
-from src.models.schemas.dedup_schema import EventSchema
+from src.services.rollups import RollupAccumulator
+from src.services.cache import response_cache
+from src.services.partitioning import partition_router
+from src.services.validation import validation_backend
 from datetime import datetime, timezone
 import logging
 
 logger = logging.getLogger("EventProcessor")
 
+class PartitionCommitError(Exception):
+    """Some dedup partitions failed to commit; `committed` lists the ones that did."""
+
+    def __init__(self, committed: list[int]):
+        super().__init__(f"Partition commit failed (committed: {committed})")
+        self.committed = committed
+
 class EventProcessor:
     def __init__(self, db: Session):
         self.db = db
 
     def process_batch(self, events_data: list[dict]):
-        processed_ids = []
-        duplicates = 0
-        unique_count = 0
-        
-        # We need to process sequentially to ensure atomic handling of each item
-        # or we could try to bulk insert? 
-        # Requirement: "Transactions: Apply transaction when insert/processing"
-        
-        for raw_event in events_data:
+        # CPU-bound validation, inline or across the process pool for large batches
+        rows = validation_backend.build_rows(events_data)
+
+        # Partition transactions stay open until Stats/rollups are ready on the main database
+        partition_sessions = {}
+        try:
+            if partition_router.enabled:
+                inserted, duplicated, partition_sessions = self._insert_partitioned(rows)
+            else:
+                inserted, duplicated = self._insert_events(self.db, rows)
+
+            unique_count = len(inserted)
+            duplicates = len(duplicated)
+
+            rollups = RollupAccumulator()
+            for row in inserted:
+                rollups.add(row["topic"], row["source"], row["timestamp"], row["payload"])
+            for row in duplicated:
+                rollups.add(row["topic"], row["source"], row["timestamp"], duplicate=True)
+
+            # Atomic Stats Update
+            if events_data:
+                self._update_stats(len(events_data), unique_count, duplicates)
+                # Rollups share the batch transaction so they never drift from dedup
+                rollups.flush(self.db)
+
+            committed_partitions = []
             try:
-                event_schema = EventSchema(**raw_event)
+                if partition_sessions:
+                    self.db.flush()
+                    committed_partitions = self._commit_partitions(partition_sessions)
+                self.db.commit()
             except Exception as e:
-                logger.error(f"Invalid event data: {e}")
-                continue 
+                self.db.rollback()
+                logger.error(f"Commit failed: {e}")
+                if isinstance(e, PartitionCommitError):
+                    committed_partitions = e.committed
+                # Keep dedup and Stats consistent: a retry must see these events as new again
+                self._undo_partitioned(inserted, committed_partitions)
+                raise e
+        finally:
+            for session in partition_sessions.values():
+                session.close()
+
+        # Only after the commit is visible, so a cache refill can't capture the old state
+        if events_data:
+            response_cache.bump({row["topic"] for row in rows})
+
+        logger.info(f"Batch Result: {unique_count} unique, {duplicates} duplicates.")
+        
+        return {
+            "status": "ok",
+            "processed_count": unique_count,
+            "duplicates_skipped": duplicates,
+            "total_received": len(events_data)
+        }
+
+    @staticmethod
+    def _insert_events(db: Session, rows: list[dict]):
+        """Insert events one savepoint at a time. Returns (inserted, duplicated); commit is up to the caller."""
+        inserted = []
+        duplicated = []
 
+        # We need to process sequentially to ensure atomic handling of each item
+        # Requirement: "Transactions: Apply transaction when insert/processing"
+        for row in rows:
             # Create model instance
-            new_event = DedupEvent(
-                event_id=event_schema.event_id,
-                topic=event_schema.topic,
-                source=event_schema.source,
-                timestamp=event_schema.timestamp,
-                payload=event_schema.payload
-            )
+            new_event = DedupEvent(**row)
             
             try:
                 # Use subtransaction (SAVEPOINT) for each insert to handle duplicates gracefully
-                with self.db.begin_nested(): 
-                    self.db.add(new_event)
-                    self.db.flush() # Check constraints immediately
+                with db.begin_nested(): 
+                    db.add(new_event)
+                    db.flush() # Check constraints immediately
                 
-                unique_count += 1
-                processed_ids.append(event_schema.event_id)
+                inserted.append(row)
                 
             except IntegrityError:
                 # Duplicate detected (topic + event_id collision)
-                duplicates += 1
+                duplicated.append(row)
                 # Subtransaction rolls back automatically
             except Exception as e:
-                logger.error(f"Error processing event {event_schema.event_id}: {e}")
+                logger.error(f"Error processing event {row['event_id']}: {e}")
 
-        # Atomic Stats Update
-        if events_data:
-            self._update_stats(len(events_data), unique_count, duplicates)
+        return inserted, duplicated
+
+    def _insert_partitioned(self, rows: list[dict]):
+        """
+        Split the batch by partition and insert every partition in parallel.
+        Returns the still-open partition sessions; process_batch commits them
+        once Stats/rollups have been written to the main database.
+        """
+        by_partition: dict[int, list[dict]] = {}
+        for row in rows:
+            index = partition_router.partition_for(row["topic"], row["event_id"])
+            by_partition.setdefault(index, []).append(row)
+
+        sessions = {index: partition_router.session(index) for index in by_partition}
+
+        def work(index: int, items: list[dict]):
+            return self._insert_events(sessions[index], items)
 
+        inserted = []
+        duplicated = []
         try:
-            self.db.commit()
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Commit failed: {e}")
-            raise e
+            results = partition_router.run(work, by_partition)
+        except Exception:
+            for session in sessions.values():
+                session.close()
+            raise
+        for part_inserted, part_duplicated in results.values():
+            inserted.extend(part_inserted)
+            duplicated.extend(part_duplicated)
+        return inserted, duplicated, sessions
 
-        logger.info(f"Batch Result: {unique_count} unique, {duplicates} duplicates.")
-        
-        return {
-            "status": "ok",
-            "processed_count": unique_count,
-            "duplicates_skipped": duplicates,
-            "total_received": len(events_data)
-        }
+    @staticmethod
+    def _commit_partitions(sessions: dict[int, Session]) -> list[int]:
+        """Commit every partition in parallel. Raises if any failed, after the others committed."""
+        def commit(index: int, session: Session):
+            try:
+                session.commit()
+                return True
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Partition {index} commit failed: {e}")
+                return False
+
+        results = partition_router.run(commit, sessions)
+        committed = [index for index, ok in results.items() if ok]
+        if len(committed) != len(sessions):
+            raise PartitionCommitError(committed)
+        return committed
+
+    @staticmethod
+    def _undo_partitioned(inserted: list[dict], committed: list[int]):
+        """
+        Compensate partitions that committed before the main database failed.
+        Without a two-phase commit a crash between the two commits can still
+        leave these rows stored but uncounted.
+        """
+        keys_by_partition: dict[int, list[tuple]] = {}
+        for row in inserted:
+            index = partition_router.partition_for(row["topic"], row["event_id"])
+            if index in committed:
+                keys_by_partition.setdefault(index, []).append((row["topic"], row["event_id"]))
+
+        def undo(index: int, keys: list[tuple]):
+            with partition_router.session(index) as session:
+                session.query(DedupEvent).filter(
+                    tuple_(DedupEvent.topic, DedupEvent.event_id).in_(keys)
+                ).delete(synchronize_session=False)
+                session.commit()
+
+        try:
+            partition_router.run(undo, keys_by_partition)
+        except Exception as e:
+            logger.error(f"Undoing partition inserts failed: {e}")
 
     def _update_stats(self, received, unique, duplicates):
         # Atomic update logic
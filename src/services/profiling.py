@@ -0,0 +1,180 @@
+from collections import OrderedDict
+from contextvars import ContextVar
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from pathlib import Path
+import cProfile
+import hmac
+import io
+import json
+import logging
+import pstats
+import random
+import threading
+import time
+import uuid
+import os
+
+logger = logging.getLogger("Profiling")
+
+# Nothing below is wired into the app unless this is set, so production pays no cost by default
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# A request whose PROFILE_HEADER equals PROFILE_SECRET is always profiled.
+# Without a secret the header is ignored, so clients can't force profiling overhead.
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+# Fraction of all other requests to profile, 0.0 - 1.0
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.0"))
+# Optional directory for <id>.prof (pstats) and <id>.json reports
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+# Number of reports kept in memory for /debug/profiles and in PROFILE_DIR
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_TOP_FUNCTIONS = 30
+
+# Report of the request being profiled; copied into the threadpool for sync endpoints
+_current_report: ContextVar[dict | None] = ContextVar("profile_report", default=None)
+# cProfile can only run one profiler at a time per interpreter
+_cpu_lock = threading.Lock()
+_reports: OrderedDict = OrderedDict()
+_reports_lock = threading.Lock()
+
+router = APIRouter(prefix="/debug/profiles")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_report.get() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    report = _current_report.get()
+    if report is None:
+        return
+    started = getattr(context, "_profile_started", None)
+    duration = (time.perf_counter() - started) * 1000 if started else None
+    rowcount = cursor.rowcount
+    report["sql"].append({
+        "statement": statement,
+        "duration_ms": round(duration, 3) if duration is not None else None,
+        # DB-API reports -1 for SELECTs before the rows are fetched
+        "rowcount": rowcount if rowcount is not None and rowcount >= 0 else None,
+        "executemany": executemany,
+    })
+
+
+def _should_profile(request: Request) -> bool:
+    if request.url.path.startswith(router.prefix):
+        return False
+    value = request.headers.get(PROFILE_HEADER)
+    if value and PROFILE_SECRET and hmac.compare_digest(value.encode(), PROFILE_SECRET.encode()):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _cpu_summary(profiler: cProfile.Profile) -> str:
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+def _store(report: dict, profiler: cProfile.Profile | None):
+    with _reports_lock:
+        _reports[report["id"]] = report
+        while len(_reports) > PROFILE_KEEP:
+            _reports.popitem(last=False)
+
+    if not PROFILE_DIR:
+        return
+    try:
+        directory = Path(PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        if profiler is not None:
+            profiler.dump_stats(str(directory / f"{report['id']}.prof"))
+        (directory / f"{report['id']}.json").write_text(json.dumps(report, indent=2))
+        _prune_dir(directory)
+    except Exception as e:
+        logger.error(f"Writing profile {report['id']} failed: {e}")
+
+
+def _prune_dir(directory: Path):
+    """Keep only the newest PROFILE_KEEP reports on disk, like the in-memory list."""
+    reports = sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+    for old in reports[PROFILE_KEEP:]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".prof").unlink(missing_ok=True)
+
+
+async def profile_middleware(request: Request, call_next):
+    if not _should_profile(request):
+        return await call_next(request)
+
+    report = {
+        "id": uuid.uuid4().hex,
+        "method": request.method,
+        "path": request.url.path,
+        "query": str(request.query_params),
+        "started_at": time.time(),
+        "sql": [],
+    }
+    token = _current_report.set(report)
+
+    # The CPU profile covers the event-loop thread only: async handlers such as /publish are
+    # captured, but sync handlers (/events, /stats) and batches offloaded to the threadpool are not.
+    # SQL tracing covers every thread the request's context reaches.
+    # The profiler stays enabled across the await, so other requests handled on the event loop
+    # meanwhile are counted in this report too; profile under low concurrency for clean numbers.
+    # If another request is already being CPU-profiled, this one only gets SQL tracing.
+    profiler = cProfile.Profile() if _cpu_lock.acquire(blocking=False) else None
+    started = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        response = await call_next(request)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _cpu_lock.release()
+        _current_report.reset(token)
+
+    report["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    report["status_code"] = response.status_code
+    report["sql_count"] = len(report["sql"])
+    report["sql_ms"] = round(sum(q["duration_ms"] or 0 for q in report["sql"]), 3)
+    report["cpu"] = _cpu_summary(profiler) if profiler is not None else None
+    _store(report, profiler)
+
+    response.headers["X-Profile-Id"] = report["id"]
+    return response
+
+
+@router.get("")
+def list_profiles():
+    with _reports_lock:
+        reports = list(_reports.values())
+    return [
+        {key: r.get(key) for key in
+         ("id", "method", "path", "status_code", "duration_ms", "sql_count", "sql_ms", "started_at")}
+        for r in reversed(reports)
+    ]
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str):
+    with _reports_lock:
+        report = _reports.get(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
+
+
+def install(app: FastAPI):
+    """Attach the profiling middleware, SQL tracing and /debug/profiles endpoints."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.middleware("http")(profile_middleware)
+    app.include_router(router)
+    if not PROFILE_SECRET:
+        logger.info(f"PROFILE_SECRET is not set, the {PROFILE_HEADER} header is ignored.")
+    logger.info(f"Profiling enabled (header {PROFILE_HEADER}, sample rate {PROFILE_SAMPLE_RATE}).")
@@ -0,0 +1,140 @@
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from src.models.rollup_model import TopicRollup
+from src.timeutils import as_naive_utc
+from datetime import datetime, timezone
+import logging
+import os
+
+logger = logging.getLogger("RollupAccumulator")
+
+BUCKETS = ("minute", "hour")
+ROLLUP_BUCKETS = [
+    b.strip() for b in os.getenv("ROLLUP_BUCKETS", "minute,hour").split(",")
+    if b.strip() in BUCKETS
+]
+# Numeric payload field aggregated into min/max/avg (empty string disables it)
+ROLLUP_VALUE_FIELD = os.getenv("ROLLUP_VALUE_FIELD", "value")
+
+
+def truncate(ts: datetime, bucket: str) -> datetime:
+    """Floor a timestamp to the start of its bucket, as naive UTC."""
+    ts = as_naive_utc(ts)
+    if bucket == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(second=0, microsecond=0)
+
+
+def extract_value(payload):
+    if not ROLLUP_VALUE_FIELD or not isinstance(payload, dict):
+        return None
+    value = payload.get(ROLLUP_VALUE_FIELD)
+    # bool is an int subclass but is not a measurement
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+class RollupAccumulator:
+    """
+    Collects per-bucket deltas for one batch in memory, then applies them
+    with one UPDATE (or INSERT) per touched bucket instead of one per event.
+    """
+
+    def __init__(self):
+        self.deltas: dict[tuple, dict] = {}
+
+    def add(self, topic: str, source: str | None, timestamp: datetime | None,
+            payload=None, duplicate: bool = False):
+        if timestamp is None:
+            timestamp = datetime.now(timezone.utc)
+        value = None if duplicate else extract_value(payload)
+
+        for bucket in ROLLUP_BUCKETS:
+            key = (topic, bucket, truncate(timestamp, bucket), source or "")
+            delta = self.deltas.setdefault(key, {
+                "unique": 0, "duplicate": 0,
+                "count": 0, "sum": 0.0, "min": None, "max": None,
+            })
+            if duplicate:
+                delta["duplicate"] += 1
+                continue
+            delta["unique"] += 1
+            if value is not None:
+                delta["count"] += 1
+                delta["sum"] += value
+                delta["min"] = value if delta["min"] is None else min(delta["min"], value)
+                delta["max"] = value if delta["max"] is None else max(delta["max"], value)
+
+    def merge(self, deltas: dict[tuple, dict]):
+        """Fold in deltas collected by another accumulator (e.g. in an import worker process)."""
+        for key, other in deltas.items():
+            delta = self.deltas.get(key)
+            if delta is None:
+                self.deltas[key] = dict(other)
+                continue
+            for field in ("unique", "duplicate", "count", "sum"):
+                delta[field] += other[field]
+            if other["min"] is not None:
+                delta["min"] = other["min"] if delta["min"] is None else min(delta["min"], other["min"])
+            if other["max"] is not None:
+                delta["max"] = other["max"] if delta["max"] is None else max(delta["max"], other["max"])
+
+    def flush(self, db: Session):
+        """Apply the collected deltas. Commit happens in the caller."""
+        for (topic, bucket, bucket_start, source), delta in self.deltas.items():
+            try:
+                if not self._increment(db, topic, bucket, bucket_start, source, delta):
+                    self._insert(db, topic, bucket, bucket_start, source, delta)
+            except Exception as e:
+                logger.error(f"Rollup update failed for {topic}/{bucket}/{bucket_start}: {e}")
+        self.deltas.clear()
+
+    def _increment(self, db, topic, bucket, bucket_start, source, delta) -> bool:
+        values = {
+            TopicRollup.unique_count: TopicRollup.unique_count + delta["unique"],
+            TopicRollup.duplicate_count: TopicRollup.duplicate_count + delta["duplicate"],
+        }
+        if delta["count"]:
+            values.update({
+                TopicRollup.value_count: TopicRollup.value_count + delta["count"],
+                TopicRollup.value_sum: TopicRollup.value_sum + delta["sum"],
+                TopicRollup.value_min: case(
+                    (TopicRollup.value_min.is_(None), delta["min"]),
+                    (TopicRollup.value_min > delta["min"], delta["min"]),
+                    else_=TopicRollup.value_min,
+                ),
+                TopicRollup.value_max: case(
+                    (TopicRollup.value_max.is_(None), delta["max"]),
+                    (TopicRollup.value_max < delta["max"], delta["max"]),
+                    else_=TopicRollup.value_max,
+                ),
+            })
+        updated = db.query(TopicRollup).filter(
+            TopicRollup.topic == topic,
+            TopicRollup.bucket == bucket,
+            TopicRollup.bucket_start == bucket_start,
+            TopicRollup.source == source,
+        ).update(values, synchronize_session=False)
+        return updated > 0
+
+    def _insert(self, db, topic, bucket, bucket_start, source, delta):
+        try:
+            with db.begin_nested():
+                db.add(TopicRollup(
+                    topic=topic,
+                    bucket=bucket,
+                    bucket_start=bucket_start,
+                    source=source,
+                    unique_count=delta["unique"],
+                    duplicate_count=delta["duplicate"],
+                    value_count=delta["count"],
+                    value_sum=delta["sum"],
+                    value_min=delta["min"],
+                    value_max=delta["max"],
+                ))
+                db.flush()
+        except IntegrityError:
+            # Another worker created the bucket first, fold our delta into it
+            self._increment(db, topic, bucket, bucket_start, source, delta)
@@ -0,0 +1,92 @@
+from concurrent.futures import ProcessPoolExecutor
+from src.models.schemas.dedup_schema import EventSchema
+from src.timeutils import as_naive_utc
+import multiprocessing
+import logging
+import threading
+import os
+
+logger = logging.getLogger("Validation")
+
+# "inline" validates on the request thread, "process" sends large batches to a process pool
+VALIDATION_BACKEND = os.getenv("VALIDATION_BACKEND", "inline")
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", str(os.cpu_count() or 1)))
+# Batches smaller than this stay inline: pickling to a worker costs more than it saves
+VALIDATION_THRESHOLD = int(os.getenv("VALIDATION_THRESHOLD", "2000"))
+VALIDATION_CHUNK_SIZE = int(os.getenv("VALIDATION_CHUNK_SIZE", "1000"))
+
+
+def build_row(raw_event: dict) -> dict:
+    """Validate one raw event into DedupEvent column values. Raises on invalid input."""
+    event_schema = EventSchema(**raw_event)
+    return {
+        "event_id": event_schema.event_id,
+        "topic": event_schema.topic,
+        "source": event_schema.source,
+        "timestamp": as_naive_utc(event_schema.timestamp),
+        "payload": event_schema.payload,
+    }
+
+
+def build_rows(events_data: list) -> list[dict]:
+    """Validate a chunk of raw events, dropping (and logging) invalid ones. Runs in pool workers."""
+    rows = []
+    for raw_event in events_data:
+        try:
+            rows.append(build_row(raw_event))
+        except Exception as e:
+            logger.error(f"Invalid event data: {e}")
+    return rows
+
+
+class ValidationBackend:
+    """
+    Runs the CPU-bound part of a batch (EventSchema validation, timestamp
+    parsing, row building) either inline or split into chunks across a
+    process pool. Chunks come back in input order, so the first copy of an
+    in-batch duplicate is still the one that gets inserted.
+    """
+
+    def __init__(self, backend: str = VALIDATION_BACKEND, workers: int = VALIDATION_WORKERS,
+                 threshold: int = VALIDATION_THRESHOLD, chunk_size: int = VALIDATION_CHUNK_SIZE):
+        self.backend = backend
+        self.workers = workers
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def offloads(self, batch_size: int) -> bool:
+        return self.backend == "process" and batch_size >= self.threshold
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.pool is None:
+                # spawn, not fork: the server process already runs threads and open DB connections
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"Validation process pool started with {self.workers} workers.")
+            return self.pool
+
+    def build_rows(self, events_data: list) -> list[dict]:
+        if not self.offloads(len(events_data)):
+            return build_rows(events_data)
+
+        chunks = [
+            events_data[i:i + self.chunk_size]
+            for i in range(0, len(events_data), self.chunk_size)
+        ]
+        rows = []
+        for chunk_rows in self._get_pool().map(build_rows, chunks):
+            rows.extend(chunk_rows)
+        return rows
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=True)
+                self.pool = None
+
+
+validation_backend = ValidationBackend()
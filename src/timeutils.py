@@ -0,0 +1,9 @@
+from datetime import datetime, timezone
+
+# Kept free of database imports: process-pool workers import this via src.services.validation
+
+def as_naive_utc(ts: datetime | None) -> datetime | None:
+    """Timestamps are stored as naive UTC (DateTime columns without timezone)."""
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
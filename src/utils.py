@@ -26,25 +26,28 @@ DEFAULT_DB_URL = f"sqlite:///{DB_PATH}"
 
 DATABASE_URL = os.getenv("DATABASE_URL", DEFAULT_DB_URL)
 
+def create_db_engine(url: str):
+    connect_args = {}
+    if "sqlite" in url:
+        connect_args["check_same_thread"] = False
+        execution_options = {}
+    else:
+        # For Postgres, explicit isolation level
+        execution_options = {"isolation_level": "READ COMMITTED"}
+
+    return create_engine(
+        url, 
+        echo=False, 
+        connect_args=connect_args,
+        execution_options=execution_options
+    )
+
 # Retry logic for DB connection (helpful for docker-compose startup)
 engine = None
-connect_args = {}
-
-if "sqlite" in DATABASE_URL:
-    connect_args["check_same_thread"] = False
-    execution_options = {}
-else:
-    # For Postgres, explicit isolation level
-    execution_options = {"isolation_level": "READ COMMITTED"}
 
 for i in range(5):
     try:
-        engine = create_engine(
-            DATABASE_URL, 
-            echo=False, 
-            connect_args=connect_args,
-            execution_options=execution_options
-        )
+        engine = create_db_engine(DATABASE_URL)
         # Test connection
         with engine.connect() as conn:
             pass
@@ -55,12 +58,7 @@ for i in range(5):
 
 if not engine:
     # Final attempt or crash
-    engine = create_engine(
-        DATABASE_URL, 
-        echo=False, 
-        connect_args=connect_args,
-        execution_options=execution_options
-    )
+    engine = create_db_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
@@ -14,6 +14,8 @@ from src.utils import Base, get_db
 import src.utils
 import src.main
 from src.main import app
+from src.services.cache import response_cache
+from src.services.idempotency import idempotency_store
 
 # Use in-memory SQLite with StaticPool for concurrency/threading support
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -56,5 +58,8 @@ def client(db_session):
         yield db_session
         
     app.dependency_overrides[get_db] = override_get_db
+    # Each test rolls its data back, so responses cached by earlier tests are stale
+    response_cache.clear()
+    idempotency_store.clear()
     with TestClient(app) as c:
         yield c
@@ -136,3 +136,141 @@ def test_small_stress(client):
     stats = client.get("/stats").json()
     assert stats["unique_processed"] == 300
     assert elapsed < 5.0
+
+# Rollup time-series
+def test_timeseries_rollup(client):
+    ts = "2024-05-01T10:15:30+00:00"
+    events = [
+        dict(make_event(f"r{i}", topic="rollup", payload={"value": v}), timestamp=ts)
+        for i, v in enumerate([10, 20, 30])
+    ]
+    client.post("/publish", json=events)
+    client.post("/publish", json=events[0])
+
+    r = client.get("/stats/timeseries", params={"topic": "rollup", "bucket": "minute"})
+    assert r.status_code == 200
+    data = r.json()
+    assert len(data) == 1
+    row = data[0]
+    assert row["bucket_start"] == "2024-05-01T10:15:00"
+    assert row["unique"] == 3
+    assert row["duplicates"] == 1
+    assert row["value_min"] == 10
+    assert row["value_max"] == 30
+    assert row["value_avg"] == 20
+
+    # Second batch folds into the existing bucket
+    client.post("/publish", json=dict(make_event("r9", topic="rollup", payload={"value": 0}), timestamp=ts))
+    row = client.get("/stats/timeseries", params={"topic": "rollup"}).json()[0]
+    assert row["unique"] == 4
+    assert row["value_min"] == 0
+    assert row["value_avg"] == 15
+
+    hourly = client.get("/stats/timeseries", params={"topic": "rollup", "bucket": "hour"}).json()
+    assert hourly[0]["bucket_start"] == "2024-05-01T10:00:00"
+    assert hourly[0]["unique"] == 4
+
+def test_timeseries_invalid_bucket(client):
+    r = client.get("/stats/timeseries", params={"bucket": "week"})
+    assert r.status_code == 400
+
+# Read cache
+def test_events_cache_invalidation(client):
+    client.post("/publish", json=make_event("c1", topic="cached"))
+    first = client.get("/events", params={"topic": "cached"})
+    assert len(first.json()) == 1
+    etag = first.headers["etag"]
+
+    # Identical read is a hit and honours If-None-Match
+    hits_before = client.get("/stats/cache").json()["hits"]
+    r = client.get("/events", params={"topic": "cached"}, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert client.get("/stats/cache").json()["hits"] == hits_before + 1
+
+    # Publishing to the topic invalidates the cached page
+    client.post("/publish", json=make_event("c2", topic="cached"))
+    r = client.get("/events", params={"topic": "cached"}, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert len(r.json()) == 2
+
+def test_stats_cache_invalidated_by_duplicates(client):
+    e = make_event("c3", topic="cached-stats")
+    client.post("/publish", json=e)
+    assert client.get("/stats").json()["duplicate_dropped"] == 0
+    client.post("/publish", json=e)
+    assert client.get("/stats").json()["duplicate_dropped"] == 1
+
+def test_response_cache_eviction_and_staleness():
+    from src.services.cache import ResponseCache
+    cache = ResponseCache(max_entries=2, max_staleness=60, enabled=True)
+    for k in ("a", "b", "c"):
+        cache.put(k, 0, b"{}")
+    assert cache.get("a", 0) is None
+    assert cache.get("c", 0) is not None
+    assert cache.metrics()["evictions"] == 1
+
+    cache.max_staleness = 0
+    time.sleep(0.01)
+    assert cache.get("c", 0) is None
+
+# /events filters
+def test_events_time_and_source_filters(client):
+    events = [
+        dict(make_event("f1", topic="filt", source="iot-hub"), timestamp="2024-03-01T10:00:00+00:00"),
+        dict(make_event("f2", topic="filt", source="iot-hub"), timestamp="2024-03-01T10:05:00+00:00"),
+        dict(make_event("f3", topic="filt", source="mobile-app"), timestamp="2024-03-01T10:07:00+00:00"),
+        # Same instant as f2, expressed in another offset
+        dict(make_event("f4", topic="filt", source="iot-hub"), timestamp="2024-03-01T17:05:00+07:00"),
+    ]
+    client.post("/publish", json=events)
+
+    params = {"topic": "filt", "source": "iot-hub", "since": "2024-03-01T10:01:00Z"}
+    data = client.get("/events", params=params).json()
+    assert {e["event_id"] for e in data} == {"f2", "f4"}
+
+    data = client.get("/events", params={"topic": "filt", "until": "2024-03-01T10:05:00Z"}).json()
+    assert [e["event_id"] for e in data] == ["f1"]
+
+    r = client.get("/events", params={"source": "iot-hub", "since": "2024-03-01T10:01:00Z", "count_only": "true"})
+    assert r.json() == {"count": 2}
+    r = client.get("/events", params={"topic": "unknown", "count_only": "true"})
+    assert r.status_code == 200
+    assert r.json() == {"count": 0}
+
+# Idempotency-Key
+def test_idempotency_key_replays_first_result(client):
+    events = [make_event(f"idem{i}") for i in range(3)]
+    headers = {"Idempotency-Key": "batch-1"}
+    r1 = client.post("/publish", json=events, headers=headers)
+    assert r1.headers["idempotent-replayed"] == "false"
+    r2 = client.post("/publish", json=events, headers=headers)
+    assert r2.headers["idempotent-replayed"] == "true"
+    assert r2.json() == r1.json()
+    assert r2.json()["processed_count"] == 3
+
+    # The retry never reached the processor
+    stats = client.get("/stats").json()
+    assert stats["received"] == 3
+    assert stats["duplicate_dropped"] == 0
+
+    r3 = client.post("/publish", json=events[:1], headers=headers)
+    assert r3.status_code == 422
+
+def test_idempotency_coalesces_in_flight():
+    import asyncio
+    from src.services.idempotency import IdempotencyStore
+    store = IdempotencyStore(ttl=60, max_keys=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"processed_count": 1}
+
+    async def main():
+        return await asyncio.gather(*(store.run("k", "fp", compute) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert all(result == {"processed_count": 1} for result, _ in results)
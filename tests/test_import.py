@@ -0,0 +1,136 @@
+import json
+import importlib
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from src.models.dedup_model import DedupEvent
+from src.models.stats_model import Stats
+from src.models.rollup_model import TopicRollup
+from src.services import bulk_import
+from src.services.bulk_import import run_import
+
+def event(event_id, topic="backfill", value=1):
+    return {
+        "topic": topic,
+        "event_id": event_id,
+        "timestamp": "2024-02-01T08:30:00Z",
+        "source": "archive",
+        "payload": {"value": value},
+    }
+
+def write_jsonl(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+def test_bulk_import_dedupes_input_and_existing(tmp_path):
+    url = f"sqlite:///{tmp_path / 'import.sqlite'}"
+    first = write_jsonl(tmp_path / "a.jsonl", [
+        json.dumps(event("e1", value=10)),
+        json.dumps(event("e2", value=20)),
+        json.dumps(event("e1", value=10)),        # duplicate within the file
+        "not json",
+        json.dumps({"topic": "backfill"}),        # missing event_id
+        json.dumps([event("e3", value=30), event("e4", value=40)]),
+    ])
+    totals = run_import([first], url, workers=1, chunk_size=2)
+    assert totals["received"] == 7
+    assert totals["invalid"] == 2
+    assert totals["unique"] == 4
+    assert totals["duplicates"] == 1
+
+    # Second file overlaps with what is already stored
+    second = write_jsonl(tmp_path / "b.jsonl", [json.dumps(event(f"e{i}")) for i in range(3, 7)])
+    totals = run_import([second], url, workers=1)
+    assert totals["unique"] == 2
+    assert totals["duplicates"] == 2
+
+    # Duplicate inside one chunk
+    third = write_jsonl(tmp_path / "c.jsonl", [json.dumps(event("e7"))] * 2)
+    totals = run_import([third], url, workers=1)
+    assert (totals["unique"], totals["duplicates"]) == (1, 1)
+
+    engine = create_engine(url)
+    with Session(engine) as db:
+        assert db.query(DedupEvent).count() == 7
+        stats = db.query(Stats).filter(Stats.id == 1).one()
+        assert (stats.received, stats.unique_processed, stats.duplicate_dropped) == (13, 7, 4)
+        minute = db.query(TopicRollup).filter_by(topic="backfill", bucket="minute").one()
+        assert minute.unique_count == 7
+        assert minute.duplicate_count == 4
+        assert minute.value_min == 1
+        assert minute.value_max == 40
+    engine.dispose()
+
+def test_missing_file_fails_before_loading(tmp_path):
+    db_path = tmp_path / "missing.sqlite"
+    present = write_jsonl(tmp_path / "present.jsonl", [json.dumps(event("m1"))])
+    with pytest.raises(FileNotFoundError, match="absent.jsonl"):
+        run_import([present, tmp_path / "absent.jsonl"], f"sqlite:///{db_path}", workers=1)
+    # Nothing was loaded, the database was never even opened
+    assert not db_path.exists()
+
+def test_failed_file_keeps_stats_consistent(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'partial.sqlite'}"
+    files = [
+        write_jsonl(tmp_path / f"f{n}.jsonl", [json.dumps(event(f"f{n}-{i}")) for i in range(6)])
+        for n in range(2)
+    ]
+    load_rows = bulk_import.load_rows
+    calls = []
+    def flaky_load_rows(engine, rows):
+        calls.append(len(rows))
+        if len(calls) == 5:
+            raise RuntimeError("connection lost")
+        return load_rows(engine, rows)
+    monkeypatch.setattr(bulk_import, "load_rows", flaky_load_rows)
+
+    # The first file and one chunk of the second are loaded before the failure
+    with pytest.raises(RuntimeError):
+        run_import(files, url, workers=1, chunk_size=2)
+
+    def check(unique):
+        engine = create_engine(url)
+        with Session(engine) as db:
+            assert db.query(DedupEvent).count() == unique
+            stats = db.query(Stats).filter(Stats.id == 1).one()
+            assert stats.unique_processed == unique
+            minute = db.query(TopicRollup).filter_by(topic="backfill", bucket="minute").one()
+            assert minute.unique_count == unique
+        engine.dispose()
+    check(8)
+
+    monkeypatch.undo()
+    totals = run_import(files, url, workers=1, chunk_size=2)
+    assert (totals["unique"], totals["duplicates"]) == (4, 8)
+    check(12)
+
+def test_bulk_import_parallel_files(tmp_path):
+    url = f"sqlite:///{tmp_path / 'parallel.sqlite'}"
+    files = [
+        write_jsonl(tmp_path / f"part{n}.ndjson", [json.dumps(event(f"p{n}-{i}")) for i in range(50)])
+        for n in range(2)
+    ]
+    totals = run_import(files, url, workers=2)
+    assert totals["files"] == 2
+    assert totals["unique"] == 100
+
+def test_cli_module_runs(tmp_path, capsys):
+    url = f"sqlite:///{tmp_path / 'cli.sqlite'}"
+    path = write_jsonl(tmp_path / "cli.jsonl", [json.dumps(event("c1"))])
+    importlib.import_module("src.import").main([str(path), "--database-url", url])
+    assert json.loads(capsys.readouterr().out)["unique"] == 1
+
+def test_migrate_adds_missing_indexes(tmp_path):
+    from sqlalchemy import inspect, text
+    url = f"sqlite:///{tmp_path / 'legacy.sqlite'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        # dedup table as created before the indexes were added to the model
+        conn.execute(text(
+            "CREATE TABLE dedup (topic VARCHAR NOT NULL, event_id VARCHAR NOT NULL, "
+            "timestamp DATETIME, source VARCHAR, payload JSON, PRIMARY KEY (topic, event_id))"
+        ))
+    importlib.import_module("src.migrate").main(["--database-url", url, "--partition-urls", ""])
+    names = {index["name"] for index in inspect(engine).get_indexes("dedup")}
+    assert {"ix_dedup_topic_timestamp", "ix_dedup_source_timestamp", "ix_dedup_timestamp"} <= names
+    engine.dispose()
@@ -0,0 +1,119 @@
+import pytest
+from datetime import datetime, timezone
+from src.models.dedup_model import DedupEvent
+from sqlalchemy.orm import Session
+from src.utils import Base, create_db_engine
+from src.services.bulk_import import load_rows
+from src.services.partitioning import (
+    partition_router, partition_of, verify_layout, read_layout, PartitionLayoutMismatch,
+)
+from src.migrate import main as migrate
+
+# 'client' fixture comes from conftest.py; dedup rows go to the partition files instead
+
+def make_event(event_id: str, topic="part"):
+    return {
+        "event_id": event_id,
+        "topic": topic,
+        "source": "node-1",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "payload": {"value": 1},
+    }
+
+@pytest.fixture
+def partitions(tmp_path):
+    partition_router.configure([f"sqlite:///{tmp_path / f'p{i}.sqlite'}" for i in range(3)])
+    yield partition_router
+    partition_router.configure([])
+
+def test_partition_of_is_stable():
+    assert partition_of("t", "e1", 8) == partition_of("t", "e1", 8)
+    assert {partition_of("t", f"e{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+def test_partitioned_dedup_and_fan_out(client, partitions):
+    events = [make_event(f"p{i}", topic=f"part-{i % 2}") for i in range(30)]
+    r = client.post("/publish", json=events + events[:5])
+    data = r.json()
+    assert data["processed_count"] == 30
+    assert data["duplicates_skipped"] == 5
+
+    # Every row lives only in the partition its key hashes to
+    counts = partitions.fan_out(lambda s: s.query(DedupEvent).count())
+    assert sum(counts) == 30
+    assert sum(1 for c in counts if c) > 1
+    for index, rows in enumerate(partitions.fan_out(lambda s: s.query(DedupEvent).all())):
+        assert all(partitions.partition_for(e.topic, e.event_id) == index for e in rows)
+
+    # A retry lands on the same partition and is still a duplicate
+    r = client.post("/publish", json=events[7])
+    assert r.json()["duplicates_skipped"] == 1
+
+    assert len(client.get("/events", params={"topic": "part-0", "limit": 100}).json()) == 15
+    assert len(client.get("/events", params={"limit": 10}).json()) == 10
+    stats = client.get("/stats").json()
+    assert {"part-0", "part-1"} <= set(stats["topics"])
+
+def test_main_commit_failure_undoes_partition_inserts(client, db_session, partitions, monkeypatch):
+    def failing_commit():
+        raise RuntimeError("main database unavailable")
+    monkeypatch.setattr(db_session, "commit", failing_commit)
+
+    events = [make_event(f"fail{i}") for i in range(10)]
+    with pytest.raises(RuntimeError):
+        client.post("/publish", json=events)
+    assert sum(partitions.fan_out(lambda s: s.query(DedupEvent).count())) == 0
+
+    # The retry counts every event as new, not as a duplicate
+    monkeypatch.undo()
+    r = client.post("/publish", json=events)
+    assert r.json()["processed_count"] == 10
+
+def stored_row(event_id: str):
+    return {"topic": "moved", "event_id": event_id, "source": "node-1",
+            "timestamp": datetime(2024, 1, 1), "payload": None}
+
+def test_layout_change_is_refused_until_repartitioned(tmp_path):
+    main_url = f"sqlite:///{tmp_path / 'main.sqlite'}"
+    urls = [f"sqlite:///{tmp_path / f'p{i}.sqlite'}" for i in range(3)]
+    engine = create_db_engine(main_url)
+    Base.metadata.create_all(bind=engine)
+    load_rows(engine, [stored_row(f"m{i}") for i in range(60)])
+
+    # Existing rows in the main dedup table would be invisible to partitioned dedup
+    with Session(engine) as db:
+        with pytest.raises(PartitionLayoutMismatch):
+            verify_layout(db, urls[:2])
+
+    migrate(["--database-url", main_url, "--partition-urls", ",".join(urls[:2]), "--repartition"])
+    with Session(engine) as db:
+        verify_layout(db, urls[:2])
+        assert db.query(DedupEvent).count() == 0
+        # Going from 2 to 3 partitions remaps most keys
+        with pytest.raises(PartitionLayoutMismatch):
+            verify_layout(db, urls)
+
+    migrate(["--database-url", main_url, "--partition-urls", ",".join(urls), "--repartition"])
+    with Session(engine) as db:
+        verify_layout(db, urls)
+        assert read_layout(db).partition_count == 3
+    engine.dispose()
+
+    partition_router.configure(urls)
+    try:
+        counts = partition_router.fan_out(lambda s: s.query(DedupEvent).count())
+        assert sum(counts) == 60 and all(counts)
+        for index, rows in enumerate(partition_router.fan_out(lambda s: s.query(DedupEvent).all())):
+            assert all(partition_router.partition_for(e.topic, e.event_id) == index for e in rows)
+    finally:
+        partition_router.configure([])
+
+def test_fresh_partitioned_deployment_records_layout(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'main.sqlite'}")
+    Base.metadata.create_all(bind=engine)
+    urls = [f"sqlite:///{tmp_path / 'p0.sqlite'}", f"sqlite:///{tmp_path / 'p1.sqlite'}"]
+    with Session(engine) as db:
+        verify_layout(db, urls)
+        assert read_layout(db).state == "ready"
+        with pytest.raises(PartitionLayoutMismatch):
+            verify_layout(db, [])
+    engine.dispose()
@@ -0,0 +1,86 @@
+import json
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from src.services import profiling
+from tests.conftest import test_engine
+
+# Profiling is installed on a throwaway app: middleware can't be added to the shared one after startup
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/query")
+    def query():
+        with test_engine.connect() as conn:
+            rows = conn.execute(text("SELECT 1 UNION ALL SELECT 2")).all()
+        return {"rows": len(rows)}
+
+    profiling.install(app)
+    return app
+
+def test_profile_on_header(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_SECRET", "s3cret")
+    client = TestClient(make_app())
+
+    assert "x-profile-id" not in client.get("/query").headers
+
+    r = client.get("/query", headers={"X-Profile": "s3cret"})
+    assert r.status_code == 200
+    profile_id = r.headers["x-profile-id"]
+
+    report = client.get(f"/debug/profiles/{profile_id}").json()
+    assert report["path"] == "/query"
+    assert report["sql_count"] == 1
+    assert "SELECT 1" in report["sql"][0]["statement"]
+    assert report["cpu"]
+    assert any(p["id"] == profile_id for p in client.get("/debug/profiles").json())
+
+    assert (tmp_path / f"{profile_id}.prof").exists()
+    assert json.loads((tmp_path / f"{profile_id}.json").read_text())["id"] == profile_id
+
+def test_profile_header_requires_secret(monkeypatch):
+    client = TestClient(make_app())
+    # No secret configured: the header alone never triggers profiling
+    assert "x-profile-id" not in client.get("/query", headers={"X-Profile": "1"}).headers
+
+    monkeypatch.setattr(profiling, "PROFILE_SECRET", "s3cret")
+    assert "x-profile-id" not in client.get("/query", headers={"X-Profile": "guess"}).headers
+    assert "x-profile-id" in client.get("/query", headers={"X-Profile": "s3cret"}).headers
+
+def test_profile_dir_is_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_KEEP", 2)
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    client = TestClient(make_app())
+
+    ids = [client.get("/query").headers["x-profile-id"] for _ in range(4)]
+    assert {p.stem for p in tmp_path.glob("*.json")} == set(ids[-2:])
+    assert {p.stem for p in tmp_path.glob("*.prof")} == set(ids[-2:])
+
+def test_profile_sampling(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    client = TestClient(make_app())
+    assert "x-profile-id" in client.get("/query").headers
+
+def test_sql_trace_includes_partition_queries(tmp_path, monkeypatch):
+    from src.models.dedup_model import DedupEvent
+    from src.services.partitioning import partition_router
+
+    app = FastAPI()
+
+    @app.get("/fan-out")
+    def fan_out():
+        return {"counts": partition_router.fan_out(lambda s: s.query(DedupEvent).count())}
+
+    profiling.install(app)
+    monkeypatch.setattr(profiling, "PROFILE_SECRET", "s3cret")
+    partition_router.configure([f"sqlite:///{tmp_path / f'p{i}.sqlite'}" for i in range(2)])
+    try:
+        client = TestClient(app)
+        profile_id = client.get("/fan-out", headers={"X-Profile": "s3cret"}).headers["x-profile-id"]
+        report = client.get(f"/debug/profiles/{profile_id}").json()
+        assert report["sql_count"] == 2
+    finally:
+        partition_router.configure([])
@@ -0,0 +1,56 @@
+import pytest
+from datetime import datetime, timezone
+from src.services.validation import ValidationBackend, validation_backend
+
+# 'client' fixture comes from conftest.py
+
+def make_event(event_id: str, topic="offload"):
+    return {
+        "event_id": event_id,
+        "topic": topic,
+        "source": "node-1",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "payload": {"value": 1},
+    }
+
+@pytest.fixture
+def process_backend(monkeypatch):
+    monkeypatch.setattr(validation_backend, "backend", "process")
+    monkeypatch.setattr(validation_backend, "workers", 2)
+    monkeypatch.setattr(validation_backend, "threshold", 10)
+    monkeypatch.setattr(validation_backend, "chunk_size", 7)
+    yield validation_backend
+    validation_backend.shutdown()
+
+def test_inline_below_threshold():
+    backend = ValidationBackend(backend="process", workers=2, threshold=100)
+    rows = backend.build_rows([make_event("a"), {"topic": "no-id"}])
+    assert [r["event_id"] for r in rows] == ["a"]
+    assert backend.pool is None
+
+def test_process_pool_keeps_order_and_drops_invalid(process_backend):
+    events = [make_event(f"v{i}") for i in range(30)]
+    events[5] = {"topic": "offload"}
+    events[20]["timestamp"] = "not_a_timestamp"
+    rows = process_backend.build_rows(events)
+    assert process_backend.pool is not None
+    assert [r["event_id"] for r in rows] == [f"v{i}" for i in range(30) if i not in (5, 20)]
+    assert rows[0]["timestamp"].tzinfo is None
+
+def test_publish_large_batch_offloaded(client, process_backend):
+    events = [make_event(f"o{i}") for i in range(25)]
+    r = client.post("/publish", json=events + events[:3])
+    data = r.json()
+    assert data["processed_count"] == 25
+    assert data["duplicates_skipped"] == 3
+
+def test_pool_workers_do_not_import_database_modules():
+    # Spawned workers import this module to unpickle build_rows; it must not open DB connections
+    import subprocess
+    import sys
+    code = (
+        "import sys, src.services.validation; "
+        "sys.exit(int('src.utils' in sys.modules or 'sqlalchemy' in sys.modules))"
+    )
+    root = __file__.rsplit("/tests/", 1)[0]
+    assert subprocess.run([sys.executable, "-c", code], cwd=root).returncode == 0